@@ -11,13 +11,18 @@ from requests.auth import HTTPBasicAuth
 import json
 
 import lazr.restfulclient.resource
-from oem_scripts.LaunchpadLogin import LaunchpadLogin
+from oem_scripts.LaunchpadLogin import LaunchpadLogin, ThreadLocalLaunchpad
+from concurrent.futures import ThreadPoolExecutor
 from configparser import ConfigParser
 
 HWE_PUBLIC_PROJECT = "hwe-next"
 OEM_PUBLIC_PROJECT = "oem-priority"
 
 lp = None
+threads = None
+session = requests.Session()
+# Launchpad projects looked up in this run
+_projects = {}
 log = logging.getLogger("bug-bind-logger")
 log.setLevel(logging.DEBUG)
 logging.basicConfig(
@@ -52,12 +57,62 @@ def issue_update_fields(
         }
     )
 
-    response = requests.request("PUT", url, data=payload, headers=headers, auth=auth)
+    response = session.request("PUT", url, data=payload, headers=headers, auth=auth)
 
     response.raise_for_status()
 
 
-def link_bugs(public_bugnum, privates, ihv):
+def get_project(lp, name):
+    if name not in _projects:
+        _projects[name] = lp.projects[name]
+    return _projects[name]
+
+
+def add_description_tag(priv, tag) -> tuple:
+    """Add the tag into the description of the private bug in a worker thread.
+
+    Return the bug number and the target name of its first task.
+    """
+    bug = threads.lp.bugs[priv]
+    if re.search(tag, bug.description) is None:
+        # Add the referenced bug to the private bug, if it's not in already.
+        bug.description += "\n\n{}\n".format(tag)
+        bug.lp_save()
+    else:
+        log.warning("Bug {} already linked to {}".format(bug.id, tag))
+    return bug.id, bug.bug_tasks_collection[0].bug_target_name
+
+
+def link_privates(privates, tag, pub_bug=None, jobs=8) -> list:
+    """Link the private bugs and jira issues concurrently.
+
+    Return the tags to add on the public or main bug.
+    """
+    global threads
+    if threads is None:
+        threads = ThreadLocalLaunchpad()
+    if pub_bug is not None and any(not priv.isdigit() for priv in privates):
+        jira_email, jira_token = get_jira_email_token()
+        fields = {"customfield_10596": pub_bug.web_link}
+
+    def link(priv):
+        if priv.isdigit():
+            bug_id, target_name = add_description_tag(priv, tag)
+            if pub_bug is None:
+                return ["originate-from-" + str(bug_id)]
+            # The target name is the OEM codename.
+            return ["originate-from-" + str(bug_id), target_name, "oem-priority"]
+        issue_update_fields(jira_email, jira_token, priv, fields)
+        return ["jira-" + priv.lower(), "oem-priority"]
+
+    tags = []
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for result in executor.map(link, privates):
+            tags.extend(name for name in result if name not in tags)
+    return tags
+
+
+def link_bugs(public_bugnum, privates, ihv, jobs=8):
     assert public_bugnum.isdigit()
     login = LaunchpadLogin()
     lp = login.lp
@@ -66,59 +121,31 @@ def link_bugs(public_bugnum, privates, ihv):
     tag = "X-HWE-Bug: Bug #" + public_bugnum
 
     # Add X-HWE-Bug: tag to description.
-    for priv in privates:
-        if priv.isdigit():
-            bug = lp.bugs[priv]
-
-            if re.search(tag, bug.description) is None:
-                # Add the referenced public bug to the private bug, if it's not in already.
-                bug.description += "\n\n{}\n".format(tag)
-                bug.lp_save()
-            else:
-                log.warning("Bug already linked to public bug " + tag)
-
-            add_bug_tags(
-                pub_bug,
-                [
-                    "originate-from-" + str(bug.id),
-                    bug.bug_tasks_collection[0].bug_target_name,  # OEM codename
-                    "oem-priority",
-                ],
-            )
-        else:
-            issue_key = priv
-            jira_email, jira_token = get_jira_email_token()
-            fields = {"customfield_10596": pub_bug.web_link}
-            issue_update_fields(jira_email, jira_token, issue_key, fields)
-            add_bug_tags(
-                pub_bug,
-                [
-                    "jira-" + issue_key.lower(),
-                    "oem-priority",
-                ],
-            )
-
-        if ihv == "hwe":
-            hwe_next = lp.projects[HWE_PUBLIC_PROJECT]
-            sub_url = "%s~%s" % (lp._root_uri, "canonical-hwe-team")
-            pub_bug.subscribe(person=sub_url)
-            remote_bug_tag(pub_bug, "hwe-needs-public-bug")
-        elif ihv == "swe":
-            hwe_next = lp.projects[OEM_PUBLIC_PROJECT]
-            sub_url = "%s~%s" % (lp._root_uri, "oem-solutions-engineers")
-            pub_bug.subscribe(person=sub_url)
-            remote_bug_tag(pub_bug, "swe-needs-public-bug")
+    tags = link_privates(privates, tag, pub_bug=pub_bug, jobs=jobs)
+
+    removed = []
+    if ihv == "hwe":
+        hwe_next = get_project(lp, HWE_PUBLIC_PROJECT)
+        sub_url = "%s~%s" % (lp._root_uri, "canonical-hwe-team")
+        pub_bug.subscribe(person=sub_url)
+        removed = ["hwe-needs-public-bug"]
+    elif ihv == "swe":
+        hwe_next = get_project(lp, OEM_PUBLIC_PROJECT)
+        sub_url = "%s~%s" % (lp._root_uri, "oem-solutions-engineers")
+        pub_bug.subscribe(person=sub_url)
+        removed = ["swe-needs-public-bug"]
+    else:
+        if get_project(lp, ihv):
+            hwe_next = get_project(lp, ihv)
+            removed = ["hwe-needs-public-bug"]
         else:
-            if lp.projects[ihv]:
-                hwe_next = lp.projects[ihv]
-                remote_bug_tag(pub_bug, "hwe-needs-public-bug")
-            else:
-                log.error("Project " + ihv + " not defined")
+            log.error("Project " + ihv + " not defined")
 
+    add_bug_tags(pub_bug, tags, removed)
     add_bug_task(pub_bug, hwe_next)
 
 
-def link_priv_bugs(main_bugnum, privates, ihv, watch):
+def link_priv_bugs(main_bugnum, privates, ihv, watch, jobs=8):
     assert main_bugnum.isdigit()
     login = LaunchpadLogin()
     lp = login.lp
@@ -129,19 +156,10 @@ def link_priv_bugs(main_bugnum, privates, ihv, watch):
     else:
         tag = "X-Working-Bug: Bug #" + main_bugnum
 
-    # Add X-HWE-Bug: tag to description.
     for priv in privates:
         assert priv.isdigit()
-        bug = lp.bugs[priv]
-
-        if re.search(tag, bug.description) is None:
-            # Add the referenced main bug to the private bug, if it's not in already.
-            bug.description += "\n\n{}\n".format(tag)
-            bug.lp_save()
-        else:
-            log.warning("Bug already linked to main bug " + tag)
-
-        add_bug_tags(main_bug, ["originate-from-" + str(bug.id)])
+    # Add X-HWE-Bug: tag to description.
+    add_bug_tags(main_bug, link_privates(privates, tag, jobs=jobs))
 
 
 def add_bug_task(bug, bug_task):
@@ -166,15 +184,16 @@ def remote_bug_tag(bug, tag):
         bug.lp_save()
 
 
-def add_bug_tags(bug, tags):
-    """add tags to the bug."""
+def add_bug_tags(bug, tags, removed=()):
+    """add tags to the bug and remove the removed ones in one save."""
     log.info("Add tags {} to bug {}".format(tags, bug.web_link))
-    new_tags = []
+    new_tags = [tag for tag in bug.tags if tag not in removed]
     for tag_to_add in tags:
-        if tag_to_add not in bug.tags:
+        if tag_to_add not in new_tags:
             new_tags.append(tag_to_add)
-    bug.tags = bug.tags + new_tags
-    bug.lp_save()
+    if new_tags != bug.tags:
+        bug.tags = new_tags
+        bug.lp_save()
 
 
 if __name__ == "__main__":
@@ -202,6 +221,13 @@ bug-bind.py -w private_bugnumber private_bugnumber1 private_bugnumber2..."""
         help='Launchpad project name for IHV\nExpecting "swe", "hwe", "intel", "amd", "nvidia", "lsi", "emulex"',
         default="swe",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of private bugs or jira issues linked concurrently",
+        type=int,
+        default=8,
+    )
     parser.add_argument(
         "-v",
         "--vebose",
@@ -223,8 +249,8 @@ bug-bind.py -w private_bugnumber private_bugnumber1 private_bugnumber2..."""
         parser.error("must provide private bug numbers.")
 
     if args.main:
-        link_priv_bugs(args.main, private_bugs, args.ihv, 0)
+        link_priv_bugs(args.main, private_bugs, args.ihv, 0, jobs=args.jobs)
     elif args.watch:
-        link_priv_bugs(args.watch, private_bugs, args.ihv, 1)
+        link_priv_bugs(args.watch, private_bugs, args.ihv, 1, jobs=args.jobs)
     else:
-        link_bugs(args.public, private_bugs, args.ihv)
+        link_bugs(args.public, private_bugs, args.ihv, jobs=args.jobs)
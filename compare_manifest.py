@@ -2,13 +2,24 @@
 # -*- Mode: Python; coding: utf-8; indent-tabs-mode: nil; tab-width: 4 -*-
 
 import argparse
+import gzip
 import tempfile
 import os
-import subprocess
-from email import message_from_string
+import re
+from concurrent.futures import ThreadPoolExecutor
+from apt import apt_pkg
 from difflib import SequenceMatcher
-import yaml
 import requests
+from oem_scripts import CACHE_DIR
+from oem_scripts.aptdir import setup_apt_dir
+from oem_scripts.manifest import Manifest
+
+CHANGELOG_STORE = os.path.join(CACHE_DIR, "changelogs")
+CHANGELOG_STORE_SIZE = 2 * 1024 * 1024 * 1024
+
+changelog_header = re.compile(r"^(\S+) \(([^)]+)\) [^;\n]*;", re.M)
+changelog_entries = {}
+version_number = re.compile(r"\d+(?:[.+~-]\d+)*")
 
 
 def memoize(func):
@@ -28,30 +39,66 @@ def memoize(func):
     return wrapper
 
 
-@memoize
-def query_deb(pkg, apt_cache, version, source=None):
-    if source is None:
-        r = subprocess.run(
-            [
-                "apt",
-                "-o",
-                "Dir=" + apt_cache,
-                "-o",
-                "Dir::State::status=" + apt_cache + "/var/lib/dpkg/status",
-                "show",
-                pkg + "=" + version,
-            ],
-            capture_output=True,
-            check=True,
+class ChangelogStore:
+    """Changelogs on disk keyed by (source, version)
+
+    The least recently used changelogs are evicted when the store grows
+    beyond max_size bytes.
+    """
+
+    def __init__(self, path=CHANGELOG_STORE, max_size=CHANGELOG_STORE_SIZE):
+        self.path = path
+        self.max_size = max_size
+
+    def _filename(self, source, version):
+        return os.path.join(
+            self.path, source, f"{source}_{version.replace(':', '%3a')}.gz"
         )
-        if "No packages found" in r.stderr.decode():
-            return None
 
-        control = message_from_string(r.stdout.decode())
-        source = control.get("Source") if control.get("Source") else pkg
+    def get(self, source, version):
+        filename = self._filename(source, version)
+        try:
+            with gzip.open(filename, "rt", encoding="utf-8") as f:
+                changelog = f.read()
+        except (OSError, EOFError):
+            return None
+        os.utime(filename)
+        return changelog
+
+    def put(self, source, version, changelog):
+        filename = self._filename(source, version)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(filename))
+        with gzip.open(os.fdopen(fd, "wb"), "wt", encoding="utf-8") as f:
+            f.write(changelog)
+        os.replace(tmp, filename)
+
+    def evict(self):
+        files = []
+        total = 0
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                stat = os.stat(os.path.join(root, name))
+                files.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+                total += stat.st_size
+        for _, size, filename in sorted(files):
+            if total <= self.max_size:
+                break
+            os.remove(filename)
+            total -= size
+
+
+changelog_store = ChangelogStore()
+session = requests.Session()
+
+
+def fetch_changelog(source, version):
+    changelog = changelog_store.get(source, version)
+    if changelog is not None:
+        return changelog
 
     url = "https://changelogs.ubuntu.com/changelogs/pool/main/"
-    r = requests.get(
+    r = session.get(
         url
         + (source[0:4] if source.startswith("lib") else source[0])
         + "/"
@@ -62,17 +109,177 @@ def query_deb(pkg, apt_cache, version, source=None):
         + version[version.find(":") + 1 :]
         + "/changelog"
     )
+    if r.status_code == 200:
+        changelog_store.put(source, version, r.text)
 
-    return {"source": source, "changelog": r.text}
+    return r.text
 
 
-def compare_squashfs(new_squash, old_squash, apt_cache):
+def build_source_map(cache):
+    """Map every (binary, version) in apt_pkg.Cache to its source package."""
+    records = apt_pkg.PackageRecords(cache)
+    source_map = {}
+    for pkg in cache.packages:
+        for version in pkg.version_list:
+            if version.file_list and records.lookup(version.file_list[0]):
+                source_map[(pkg.name, version.ver_str)] = (
+                    records.source_pkg if records.source_pkg else pkg.name
+                )
+    return source_map
+
+
+@memoize
+def query_deb(pkg, source_map, version, source=None):
+    source = query_source(pkg, source_map, version, source)
+    if source is None:
+        return None
+
+    return {"source": source, "changelog": fetch_changelog(source, version)}
+
+
+def query_source(pkg, source_map, version, source=None):
+    if source is None:
+        source = source_map.get((pkg.split(":")[0], version), None)
+    return source
+
+
+def parse_changelog(changelog, key=None):
+    """Split changelog into a list of (version, entry) from the newest one.
+
+    The result is cached by key, e.g. (source, version).
+    """
+    if key is not None and key in changelog_entries:
+        return changelog_entries[key]
+    entries = []
+    matches = list(changelog_header.finditer(changelog))
+    for idx, match in enumerate(matches):
+        end = matches[idx + 1].start() if idx + 1 < len(matches) else len(changelog)
+        entries.append((match.group(2), changelog[match.start() : end]))
+    if key is not None:
+        changelog_entries[key] = entries
+    return entries
+
+
+def changelog_diff(entries, old_version, new_version):
+    """Return the entries newer than old_version up to new_version."""
+    return "".join(
+        entry
+        for version, entry in entries
+        if apt_pkg.version_compare(version, old_version) > 0
+        and apt_pkg.version_compare(version, new_version) <= 0
+    )
+
+
+def normalize_name(package):
+    """Strip the ABI and version numbers from a package name or a deb path.
+
+    linux-modules-6.8.0-45-generic and linux-modules-6.8.0-47-generic both
+    become linux-modules-#-generic.
+    """
+    return version_number.sub("#", os.path.basename(package).split("_")[0])
+
+
+class RenameIndex:
+    """Added debs indexed by source package to pair them with removed ones"""
+
+    def __init__(self):
+        self.packages = {}
+        self.by_source = {}
+        self.by_name = {}
+
+    def __iter__(self):
+        return iter(list(self.packages))
+
+    def add(self, package, value):
+        self.packages[package] = value
+        self.by_source.setdefault(value["source"], {})[package] = value
+        self.by_name.setdefault((value["source"], normalize_name(package)), []).append(
+            package
+        )
+
+    def pop(self, package):
+        value = self.packages.pop(package)
+        del self.by_source[value["source"]][package]
+        self.by_name[(value["source"], normalize_name(package))].remove(package)
+        return value
+
+    def pop_rename(self, package, source):
+        """Pop the added deb renamed from the removed package.
+
+        The same name after normalize_name() is preferred and the fuzzy
+        ratio is only computed for the debs from the same source package.
+        """
+        candidates = self.by_name.get((source, normalize_name(package)), None)
+        if candidates:
+            key = candidates[0]
+            return key, self.pop(key)
+        for key in self.by_source.get(source, {}):
+            if SequenceMatcher(a=package, b=key).ratio() > 0.7:
+                return key, self.pop(key)
+        return None, None
+
+
+def collect_squashfs_queries(new_squash, old_squash):
+    queries = set()
+    for package, fields in new_squash.items():
+        if "snap:" in package:
+            continue
+        if (
+            package not in old_squash
+            or fields["version"] != old_squash[package]["version"]
+        ):
+            queries.add((package, fields["version"], fields.get("source", None)))
+    return queries
+
+
+def collect_queries(new_yaml, old_yaml):
+    """Collect the arguments of all query_deb() calls compare_manifest() needs."""
+    queries = set()
+    for section in new_yaml.keys():
+        new_yaml_data = new_yaml[section]
+        old_yaml_data = old_yaml.get(section, {})
+        for package, fields in new_yaml_data.items():
+            name = os.path.basename(package).split("_")[0]
+            if package not in old_yaml_data:
+                if ".deb" in package and (
+                    fields.get("changelog", None) is None
+                    or fields.get("source", None) is None
+                ):
+                    queries.add((name, fields["version"], fields.get("source", None)))
+                continue
+            old_fields = old_yaml_data[package]
+            if fields["md5"] == old_fields["md5"]:
+                continue
+            if ".squash" in package:
+                queries.update(
+                    collect_squashfs_queries(fields["manifest"], old_fields["manifest"])
+                )
+            if ".deb" in package and fields.get("changelog", None) is None:
+                queries.add((name, fields["version"], fields.get("source", None)))
+    return queries
+
+
+def prefetch_changelogs(queries, source_map, jobs):
+    """Run query_deb() for all queries concurrently to fill its cache."""
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=jobs)
+    session.mount("https://", adapter)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(query_deb, pkg, source_map, version, source)
+            for pkg, version, source in sorted(queries, key=str)
+        ]
+        for future in futures:
+            future.result()
+    changelog_store.evict()
+
+
+def compare_squashfs(new_squash, old_squash, source_map):
     output = {"ADDED": [], "REMOVED": [], "DIFF": []}
 
     new_squash_list = list(new_squash.keys())
     old_squash_list = list(old_squash.keys())
 
-    deb_list = {}
+    deb_list = RenameIndex()
     for package in new_squash_list:
         is_snap = True if "snap:" in package else False
         if package not in old_squash_list:
@@ -81,14 +288,14 @@ def compare_squashfs(new_squash, old_squash, apt_cache):
                 continue
             result = query_deb(
                 package,
-                apt_cache,
+                source_map,
                 new_squash[package]["version"],
                 new_squash[package].get("source", None),
             )
             if result is None:
                 output["ADDED"].append({"name": package})
                 continue
-            deb_list[package] = result
+            deb_list.add(package, dict(result, version=new_squash[package]["version"]))
             continue
         old_squash_list.remove(package)
         if is_snap:
@@ -131,27 +338,27 @@ def compare_squashfs(new_squash, old_squash, apt_cache):
             continue
 
         if new_squash[package]["version"] != old_squash[package]["version"]:
-            result_new = query_deb(
+            result = query_deb(
                 package,
-                apt_cache,
+                source_map,
                 new_squash[package]["version"],
                 new_squash[package].get("source", None),
             )
-            result_old = query_deb(
-                package,
-                apt_cache,
-                old_squash[package]["version"],
-                old_squash[package].get("source", None),
-            )
-            if result_new is None or result_old is None:
+            if result is None:
                 output["DIFF"].append({"name": package})
                 continue
-            changelog_new = result_new["changelog"]
-            changelog_old = result_old["changelog"]
+            entries = parse_changelog(
+                result["changelog"],
+                (result["source"], new_squash[package]["version"]),
+            )
             output["DIFF"].append(
                 {
                     "name": package,
-                    "changelog": changelog_new[: changelog_new.find(changelog_old)],
+                    "changelog": changelog_diff(
+                        entries,
+                        old_squash[package]["version"],
+                        new_squash[package]["version"],
+                    ),
                 }
             )
     for package in old_squash_list:
@@ -159,62 +366,51 @@ def compare_squashfs(new_squash, old_squash, apt_cache):
         if is_snap:
             output["REMOVED"].append({"name": package})
             continue
-        result = query_deb(
+        source = query_source(
             package,
-            apt_cache,
+            source_map,
             old_squash[package]["version"],
             old_squash[package].get("source", None),
         )
-        if result is not None:
-            for key, value in deb_list.copy().items():
-                if (
-                    result["source"] == value["source"]
-                    and SequenceMatcher(a=package, b=key).ratio() > 0.7
-                ):
-                    output["DIFF"].append(
-                        {
-                            "name": key,
-                            "changelog": value["changelog"][
-                                : value["changelog"].find(result["changelog"])
-                            ],
-                        }
-                    )
-                    deb_list.pop(key)
-                    break
+        if source is not None:
+            key, value = deb_list.pop_rename(package, source)
+            if key is not None:
+                entries = parse_changelog(
+                    value["changelog"], (value["source"], value["version"])
+                )
+                output["DIFF"].append(
+                    {
+                        "name": key,
+                        "changelog": changelog_diff(
+                            entries,
+                            old_squash[package]["version"],
+                            value["version"],
+                        ),
+                    }
+                )
             else:
                 output["REMOVED"].append({"name": package})
 
-    for package in list(deb_list.keys()):
+    for package in deb_list:
         output["ADDED"].append({"name": package})
 
     return output
 
 
-def compare_manifest(new_path, old_path, codename):
+def compare_manifest(new_path, old_path, codename, jobs=8):
     output = {"ADDED": [], "REMOVED": [], "DIFF": []}
-    with open(new_path, "rb") as new_yaml_fd:
-        new_yaml = yaml.load(new_yaml_fd.read(), Loader=yaml.SafeLoader)
-    with open(old_path, "rb") as old_yaml_fd:
-        old_yaml = yaml.load(old_yaml_fd.read(), Loader=yaml.SafeLoader)
+    new_yaml = Manifest(new_path)
+    old_yaml = Manifest(old_path)
 
     # build apt-cache
-    apt_cache = tempfile.TemporaryDirectory()
-    subprocess.run(
-        [
-            "setup-apt-dir.sh",
-            "--codename",
-            codename,
-            "--apt-dir",
-            apt_cache.name,
-            "--enable-source",
-        ],
-        check=True,
-    )
+    with setup_apt_dir(codename) as apt_dir:
+        source_map = build_source_map(apt_dir.cache)
+    prefetch_changelogs(collect_queries(new_yaml, old_yaml), source_map, jobs)
 
     if new_yaml.keys() != old_yaml.keys():
         print("Error! new YAML and old YAML section not matching")
     for section in new_yaml.keys():
-        deb_list = {}
+        deb_list = RenameIndex()
         new_yaml_data = new_yaml[section]
         old_yaml_data = old_yaml[section]
 
@@ -226,20 +422,28 @@ def compare_manifest(new_path, old_path, codename):
             if package not in old_yaml_data_list:
                 output_add = {"name": package}
                 if ".deb" in package:
+                    version = new_yaml_data[package]["version"]
                     changelog = new_yaml_data[package].get("changelog", None)
                     source = new_yaml_data[package].get("source", None)
                     if changelog is None or source is None:
                         result = query_deb(
                             os.path.basename(package).split("_")[0],
-                            apt_cache.name,
-                            new_yaml_data[package]["version"],
+                            source_map,
+                            version,
                             source,
                         )
                         if result is not None:
-                            deb_list[package] = result
+                            deb_list.add(package, dict(result, version=version))
                             output_add = None
                     else:
-                        deb_list[package] = {"source": source, "changelog": changelog}
+                        deb_list.add(
+                            package,
+                            {
+                                "source": source,
+                                "changelog": changelog,
+                                "version": version,
+                            },
+                        )
                         output_add = None
                 if output_add is not None:
                     output["ADDED"].append(output_add)
@@ -253,37 +457,32 @@ def compare_manifest(new_path, old_path, codename):
                     squashfs_diff = compare_squashfs(
                         new_yaml_data[package]["manifest"],
                         old_yaml_data[package]["manifest"],
-                        apt_cache.name,
+                        source_map,
                     )
                     output_diff["subcomponent"] = squashfs_diff
                 if ".deb" in package:
                     # get the changelog of the packages then output the changelog difference
+                    new_version = new_yaml_data[package]["version"]
+                    old_version = old_yaml_data[package]["version"]
                     changelog_new = new_yaml_data[package].get("changelog", None)
-                    changelog_old = old_yaml_data[package].get("changelog", None)
+                    source = new_yaml_data[package].get("source", None)
                     if changelog_new is None:
                         result = query_deb(
                             os.path.basename(package).split("_")[0],
-                            apt_cache.name,
-                            new_yaml_data[package]["version"],
-                            new_yaml_data[package].get("source", None),
-                        )
-                        changelog_new = (
-                            result["changelog"] if result is not None else None
+                            source_map,
+                            new_version,
+                            source,
                         )
-                    if changelog_old is None:
-                        result = query_deb(
-                            os.path.basename(package).split("_")[0],
-                            apt_cache.name,
-                            old_yaml_data[package]["version"],
-                            old_yaml_data[package].get("source", None),
+                        if result is not None:
+                            changelog_new = result["changelog"]
+                            source = result["source"]
+                    if changelog_new is not None:
+                        entries = parse_changelog(
+                            changelog_new, (source or package, new_version)
                         )
-                        changelog_old = (
-                            result["changelog"] if result is not None else None
+                        output_diff["changelog"] = changelog_diff(
+                            entries, old_version, new_version
                         )
-                    if changelog_new is not None and changelog_old is not None:
-                        output_diff["changelog"] = changelog_new[
-                            : changelog_new[changelog_new.find(changelog_old)]
-                        ]
                 output["DIFF"].append(output_diff)
 
         # package is removed
@@ -292,39 +491,32 @@ def compare_manifest(new_path, old_path, codename):
             if ".deb" in package:
                 # if deb packages have same source package and similar package name with package in
                 # deb_list, record the changelog difference
-                changelog = old_yaml_data[package].get("changelog", None)
-                source = old_yaml_data[package].get("source", None)
-                if changelog is None or source is None:
-                    result = query_deb(
-                        os.path.basename(package).split("_")[0],
-                        apt_cache.name,
-                        old_yaml_data[package]["version"],
-                        old_yaml_data[package].get("source", None),
-                    )
-                    if result is not None:
-                        changelog = result["changelog"]
-                        source = result["source"]
-                if changelog is not None and source is not None:
-                    for key, value in deb_list.copy().items():
-                        if (
-                            value["source"] == source
-                            and SequenceMatcher(a=package, b=key).ratio() > 0.7
-                        ):
-                            output["DIFF"].append(
-                                {
-                                    "name": key,
-                                    "changelog": value["changelog"][
-                                        : value["changelog"].find(changelog)
-                                    ],
-                                }
-                            )
-                            deb_list.pop(key)
-                            handled = True
-                            break
+                old_version = old_yaml_data[package]["version"]
+                source = query_source(
+                    os.path.basename(package).split("_")[0],
+                    source_map,
+                    old_version,
+                    old_yaml_data[package].get("source", None),
+                )
+                if source is not None:
+                    key, value = deb_list.pop_rename(package, source)
+                    if key is not None:
+                        entries = parse_changelog(
+                            value["changelog"], (value["source"], value["version"])
+                        )
+                        output["DIFF"].append(
+                            {
+                                "name": key,
+                                "changelog": changelog_diff(
+                                    entries, old_version, value["version"]
+                                ),
+                            }
+                        )
+                        handled = True
             if not handled:
                 output["REMOVED"].append({"name": package})
 
-        for package in list(deb_list.keys()):
+        for package in deb_list:
             output["ADDED"].append({"name": package})
     return output
 
@@ -391,9 +583,37 @@ if __name__ == "__main__":
     parser.add_argument(
         "--codename", dest="codename", action="store", default="noble", help="codename"
     )
+    parser.add_argument(
+        "--jobs",
+        dest="jobs",
+        action="store",
+        type=int,
+        default=8,
+        help="the number of changelogs fetched concurrently",
+    )
+    parser.add_argument(
+        "--changelog-store",
+        dest="changelog_store",
+        action="store",
+        default=CHANGELOG_STORE,
+        help="the directory to keep fetched changelogs",
+    )
+    parser.add_argument(
+        "--changelog-store-size",
+        dest="changelog_store_size",
+        action="store",
+        type=int,
+        default=CHANGELOG_STORE_SIZE,
+        help="the maximum bytes of the changelog store",
+    )
     arguments = parser.parse_args()
 
+    changelog_store.path = arguments.changelog_store
+    changelog_store.max_size = arguments.changelog_store_size
     manifest_diff = compare_manifest(
-        arguments.new_manifest_path, arguments.old_manifest_path, arguments.codename
+        arguments.new_manifest_path,
+        arguments.old_manifest_path,
+        arguments.codename,
+        arguments.jobs,
     )
     generate_report(manifest_diff, arguments.output_path)
@@ -1,33 +1,442 @@
 #!/usr/bin/python3
 
 import argparse
+import functools
+import gzip
+import lzma
 import os
 import json
 from asyncio.subprocess import PIPE
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
 from pickle import TRUE
-import shutil
+import struct
 import sys
+import tarfile
+import threading
 import re
+from fnmatch import fnmatchcase
 from subprocess import Popen
 
+from oem_scripts import CACHE_DIR
 
-def modinfo2dict(module_path):
-    module = {}
-    module["id"] = module_path.split("/")[-1]
-    if os.path.isfile(module_path):
-        cmd = "modinfo" + " " + module_path
-    elif os.path.isfile(module_path + ".zst"):
-        cmd = "modinfo" + " " + module_path + ".zst"
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+MODINFO_CACHE = os.path.join(CACHE_DIR, "modinfo")
+
+MODULE_SIG_MAGIC = b"~Module signature appended~\n"
+
+# The names used by kmod for the hash algorithms of module signatures
+HASH_ALGO = (
+    "md4",
+    "md5",
+    "sha1",
+    "rmd160",
+    "sha256",
+    "sha384",
+    "sha512",
+    "sha224",
+    "sm3",
+)
+HASH_OID = {
+    "1.2.840.113549.2.4": "md4",
+    "1.2.840.113549.2.5": "md5",
+    "1.3.14.3.2.26": "sha1",
+    "1.3.36.3.2.1": "rmd160",
+    "2.16.840.1.101.3.4.2.1": "sha256",
+    "2.16.840.1.101.3.4.2.2": "sha384",
+    "2.16.840.1.101.3.4.2.3": "sha512",
+    "2.16.840.1.101.3.4.2.4": "sha224",
+    "1.2.156.10197.1.401": "sm3",
+}
+SIG_ID = ("PGP", "X509", "PKCS#7")
+COMMON_NAME = bytes((0x55, 0x04, 0x03))
+
+
+def zstd_decompress(data):
+    if zstandard is not None:
+        with zstandard.ZstdDecompressor().stream_reader(data) as reader:
+            return reader.read()
+    proc = Popen(["zstd", "-dcq"], stdin=PIPE, stdout=PIPE)
+    return proc.communicate(data)[0]
+
+
+def decompress(filename, data):
+    if filename.endswith(".zst"):
+        return zstd_decompress(data)
+    elif filename.endswith(".xz"):
+        return lzma.decompress(data)
+    elif filename.endswith(".gz"):
+        return gzip.decompress(data)
+    return data
+
+
+def elf_section(data, name):
+    if data[:4] != b"\x7fELF":
+        return None
+    endian = "<" if data[5] == 1 else ">"
+    if data[4] == 2:
+        shoff = struct.unpack_from(endian + "Q", data, 0x28)[0]
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x3A)
+        header = endian + "IIQQQQ"
+    else:
+        shoff = struct.unpack_from(endian + "I", data, 0x20)[0]
+        shentsize, shnum, shstrndx = struct.unpack_from(endian + "HHH", data, 0x2E)
+        header = endian + "IIIIII"
+    sections = []
+    for i in range(shnum):
+        sh_name, _, _, _, offset, size = struct.unpack_from(
+            header, data, shoff + i * shentsize
+        )
+        sections.append((sh_name, offset, size))
+    _, offset, size = sections[shstrndx]
+    strtab = data[offset : offset + size]
+    name = name.encode()
+    for sh_name, offset, size in sections:
+        if strtab[sh_name : strtab.index(b"\0", sh_name)] == name:
+            return data[offset : offset + size]
+    return None
+
+
+def der(data, pos=0):
+    """Return (tag, start, end) of the DER element at pos."""
+    tag = data[pos]
+    length = data[pos + 1]
+    pos += 2
+    if length & 0x80:
+        count = length & 0x7F
+        length = int.from_bytes(data[pos : pos + count], "big")
+        pos += count
+    return tag, pos, pos + length
+
+
+def der_children(data, start, end):
+    children = []
+    while start < end:
+        child = der(data, start)
+        children.append(child)
+        start = child[2]
+    return children
+
+
+def der_oid(value):
+    first = value[0]
+    oid = [str(min(first // 40, 2)), str(first - min(first // 40, 2) * 40)]
+    n = 0
+    for byte in value[1:]:
+        n = (n << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            oid.append(str(n))
+            n = 0
+    return ".".join(oid)
+
+
+def pkcs7_signer(sig):
+    """Return (signer, key_id, hash_algo) from a PKCS#7 module signature."""
+    _, start, end = der(sig)
+    _, start, end = der_children(sig, start, end)[1]
+    _, start, end = der(sig, start)
+    _, start, end = der_children(sig, start, end)[-1]
+    _, start, end = der_children(sig, start, end)[0]
+    sid, digest = der_children(sig, start, end)[1:3]
+    signer = b""
+    key_id = b""
+    if sid[0] == 0x30:
+        issuer, serial = der_children(sig, sid[1], sid[2])[:2]
+        for rdn in der_children(sig, issuer[1], issuer[2]):
+            for atv in der_children(sig, rdn[1], rdn[2]):
+                oid, value = der_children(sig, atv[1], atv[2])[:2]
+                if sig[oid[1] : oid[2]] == COMMON_NAME:
+                    signer = sig[value[1] : value[2]]
+        key_id = sig[serial[1] : serial[2]].lstrip(b"\0")
+    else:
+        key_id = sig[sid[1] : sid[2]]
+    oid = der_children(sig, digest[1], digest[2])[0]
+    hash_algo = HASH_OID.get(der_oid(sig[oid[1] : oid[2]]), "unknown")
+    return signer, key_id, hash_algo
+
+
+def module_signature(data):
+    """Return the sig_* fields shown by modinfo for a signed module."""
+    if not data.endswith(MODULE_SIG_MAGIC):
+        return []
+    end = len(data) - len(MODULE_SIG_MAGIC) - 12
+    algo, hash, id_type, signer_len, key_id_len, sig_len = struct.unpack_from(
+        ">BBBBB3xI", data, end
+    )
+    if id_type == 2:
+        try:
+            signer, key_id, hash_algo = pkcs7_signer(data[end - sig_len : end])
+        except (IndexError, ValueError):
+            return []
+    else:
+        end -= sig_len + key_id_len
+        key_id = data[end : end + key_id_len]
+        signer = data[end - signer_len : end]
+        hash_algo = HASH_ALGO[hash] if hash < len(HASH_ALGO) else "unknown"
+    return [
+        ("sig_id", SIG_ID[id_type] if id_type < len(SIG_ID) else "unknown"),
+        ("signer", signer.decode("utf-8", errors="replace")),
+        ("sig_key", ":".join(f"{byte:02X}" for byte in key_id)),
+        ("sig_hashalgo", hash_algo),
+    ]
+
+
+def modinfo(filename, data):
+    """Return what `modinfo filename` prints for the module in data.
+
+    The output is formatted like kmod does, so the fields are parsed the same
+    way as before without running modinfo for every module. The signature
+    itself is left out because it is never used.
+    """
+    section = elf_section(data, ".modinfo") or b""
+    lines = [f"{'filename:':<16}{filename}"]
+    params = {}
+    for string in section.split(b"\0"):
+        if not string:
+            continue
+        key, _, value = string.decode("utf-8", errors="replace").partition("=")
+        if key in ("parm", "parmtype"):
+            name, colon, value = value.partition(":")
+            if colon:
+                param = params.setdefault(name, [None, None])
+                param[key == "parmtype"] = value
+            continue
+        lines.append(f"{key + ':':<16}{value}")
+    for key, value in module_signature(data):
+        lines.append(f"{key + ':':<16}{value}")
+    # kmod prints the parameters in the reverse order of their first appearance.
+    for name, (desc, type) in reversed(params.items()):
+        if desc is None:
+            lines.append(f"{'parm:':<16}{name}:{type}")
+        elif type is not None:
+            lines.append(f"{'parm:':<16}{name}:{desc} ({type})")
+        else:
+            lines.append(f"{'parm:':<16}{name}:{desc}")
+    return "\n".join(lines)
+
+
+class ArMember:
+    """File object reading only the content of the current ar member"""
+
+    def __init__(self, f, size):
+        self.f = f
+        self.left = size
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.left:
+            size = self.left
+        data = self.f.read(size)
+        self.left -= len(data)
+        return data
+
+
+def _feed(proc, member):
+    """Write the ar member into the stdin of proc in a thread."""
+    try:
+        for chunk in iter(lambda: member.read(1024 * 1024), b""):
+            proc.stdin.write(chunk)
+        proc.stdin.close()
+    except (BrokenPipeError, ValueError):
+        pass
+
+
+def deb_data(filename, tarball="data.tar"):
+    """Yield (TarInfo, content) for the files in the data.tar of a .deb
+
+    The ar archive and the compressed tarball are read as a stream, so nothing
+    is unpacked to disk and only one member is held in memory at a time.
+    """
+    with open(filename, "rb", buffering=0) as f:
+        if f.read(8) != b"!<arch>\n":
+            raise ValueError(f"{filename} is not a Debian package.")
+        while True:
+            header = f.read(60)
+            if len(header) < 60:
+                raise ValueError(f"{filename} has no {tarball} member.")
+            name = header[:16].decode().strip().rstrip("/")
+            size = int(header[48:58])
+            if name.startswith(tarball):
+                break
+            f.seek(size + size % 2, os.SEEK_CUR)
+        member = ArMember(f, size)
+        proc = None
+        if name.endswith(".zst"):
+            if zstandard is not None:
+                fileobj = zstandard.ZstdDecompressor().stream_reader(
+                    member, read_across_frames=True
+                )
+            else:
+                proc = Popen(["zstd", "-dcq"], stdin=PIPE, stdout=PIPE)
+                threading.Thread(target=_feed, args=(proc, member), daemon=True).start()
+                fileobj = proc.stdout
+            mode = "r|"
+        else:
+            fileobj = member
+            mode = "r|" + name[len(tarball) + 1 :]
+        try:
+            with tarfile.open(fileobj=fileobj, mode=mode) as tar:
+                for member in tar:
+                    if member.isfile():
+                        yield member, tar.extractfile(member).read()
+        finally:
+            if proc is not None:
+                proc.kill()
+                proc.wait()
+
+
+def deb_control(filename):
+    """Return the fields of the control file in a .deb"""
+    for member, data in deb_data(filename, "control.tar"):
+        if member.name.lstrip("./") == "control":
+            return dict(
+                line.split(": ", 1)
+                for line in data.decode("utf-8").splitlines()
+                if ": " in line and not line.startswith(" ")
+            )
+    return {}
+
+
+def deb_modules(debs, worker=None):
+    """Return (kernel_version, modules) for linux-modules debs in modules.order"""
+    if worker is None:
+        worker = module2dict
+    kernel_version = None
+    lines = []
+    futures = {}
+    jobs = os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs) as executor:
+        pending = set()
+        for deb in debs:
+            for member, data in deb_data(deb):
+                name = "/" + member.name.lstrip("./")
+                if "/lib/modules/" not in name:
+                    continue
+                path = name[name.index("/lib/modules/") :]
+                parts = path.split("/", 4)
+                if len(parts) < 5:
+                    continue
+                if parts[4] == "modules.order":
+                    kernel_version = parts[3]
+                    lines = data.decode("utf-8").splitlines()
+                elif re.search(r"\.ko(\.zst|\.xz|\.gz)?$", parts[4]):
+                    future = executor.submit(worker, None, path, data)
+                    futures[parts[4]] = future
+                    pending.add(future)
+                    # Keep the modules waiting for the workers bounded.
+                    if len(pending) > 4 * jobs:
+                        pending = wait(pending, return_when=FIRST_COMPLETED)[1]
+        if kernel_version is None:
+            raise ValueError(f"No modules.order is found in {', '.join(debs)}.")
+        modules = []
+        for line in lines:
+            module_path = line.rstrip()
+            for filename in (
+                module_path,
+                module_path + ".zst",
+                module_path + ".xz",
+                module_path + ".gz",
+            ):
+                if filename in futures:
+                    module = futures[filename].result()
+                    module["id"] = module_path.split("/")[-1]
+                    break
+            else:
+                print(
+                    f"/lib/modules/{kernel_version}/{module_path} doesn't exist",
+                    file=sys.stderr,
+                )
+                module = None
+            modules.append(module)
+    return kernel_version, modules
+
+
+def tree_modules(path, worker=None):
+    """Return the modules of an installed kernel tree in modules.order"""
+    with open(path + "/modules.order", "r") as f:
+        module_paths = [path + "/" + line.rstrip() for line in f]
+    with ProcessPoolExecutor() as executor:
+        return list(
+            executor.map(
+                functools.partial(modinfo2dict, worker=worker),
+                module_paths,
+                chunksize=64,
+            )
+        )
+
+
+def modinfo2dict(module_path, worker=None):
+    if worker is None:
+        worker = module2dict
+    for filename in (
+        module_path,
+        module_path + ".zst",
+        module_path + ".xz",
+        module_path + ".gz",
+    ):
+        if os.path.isfile(filename):
+            break
     else:
         print(module_path + " " + "doesn't exist", file=sys.stderr)
         return
-    output = Popen(cmd, stdout=PIPE, shell=TRUE).communicate()[0]
-    modinfo = output.decode(encoding="utf-8")
+    return worker(module_path.split("/")[-1], filename)
+
+
+def load_module(filename, data=None):
+    try:
+        if data is None:
+            with open(filename, "rb") as f:
+                data = f.read()
+        return decompress(filename, data)
+    except (OSError, ValueError, lzma.LZMAError) as e:
+        print(f"{filename}: {e}", file=sys.stderr)
+        return b""
+
+
+def module2meta(module_id, filename, data=None):
+    """Return the alias, firmware and parm lists of a module for --diff"""
+    meta = {"id": module_id, "alias": [], "firmware": [], "parm": []}
+    try:
+        section = elf_section(load_module(filename, data), ".modinfo") or b""
+    except struct.error as e:
+        print(f"{filename}: {e}", file=sys.stderr)
+        section = b""
+    params = {}
+    for string in section.split(b"\0"):
+        key, _, value = string.decode("utf-8", errors="replace").partition("=")
+        if key in ("alias", "firmware"):
+            meta[key].append(value)
+        elif key == "parmtype":
+            name, _, type = value.partition(":")
+            params[name] = type
+        elif key == "parm":
+            params.setdefault(value.partition(":")[0], None)
+    meta["parm"] = [
+        name + ":" + type if type else name for name, type in params.items()
+    ]
+    return meta
+
+
+def module2dict(module_id, filename, data=None):
+    module = {}
+    module["id"] = module_id
+    try:
+        output = modinfo(filename, load_module(filename, data))
+    except struct.error as e:
+        print(f"{filename}: {e}", file=sys.stderr)
+        output = ""
     line_regex = r"(?P<item>\w+):\s+(?P<value>\S+)"
     line_pattern = re.compile(line_regex)
     alias = []
     firmware = []
-    for line in modinfo.splitlines():
+    for line in output.splitlines():
         m = line_pattern.match(line)
         if m:
             if m.group("item") == "filename" and m.group("value").startswith("/tmp"):
@@ -51,17 +460,156 @@ def modinfo2dict(module_path):
     return module
 
 
-def modules_filter(modules, type):
-    type_modules = []
-    for module in modules:
-        if "alias" in module:
-            alias_list = module["alias"]
-            for a in alias_list:
-                if a.startswith(type):
-                    type_modules.append(module)
-                    break
+class ModaliasIndex:
+    """Reverse lookup from device modaliases to the modules and packages claiming them
+
+    The alias globs are stored in a prefix trie keyed by their fixed part, i.e.
+    the characters before the first wildcard. A lookup walks the trie along the
+    device modalias and only runs fnmatch on the globs found on that path.
+    """
+
+    def __init__(self, trie=None):
+        self.trie = trie if trie is not None else {}
+
+    def add(self, pattern, kind, owner):
+        fixed = re.split(r"[*?[]", pattern, 1)[0]
+        node = self.trie
+        for char in fixed:
+            node = node.setdefault(char, {})
+        node.setdefault("", []).append((pattern, kind, owner))
+
+    def add_modules(self, modules):
+        for module in modules:
+            if module is None:
+                continue
+            for alias in module.get("alias", []):
+                self.add(alias, "module", module["id"])
+
+    def add_modaliases(self, filename):
+        """Add the `alias <glob> <kind> <package>` lines of a modaliases file"""
+        with open(filename, "r") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 4 and fields[0] == "alias":
+                    self.add(fields[1], fields[2], fields[3])
+
+    def _entries(self, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, value in node.items():
+                if key == "":
+                    yield from value
+                else:
+                    stack.append(value)
+
+    def startswith(self, prefix):
+        """Return the (pattern, kind, owner) of the globs starting with prefix"""
+        node = self.trie
+        for char in prefix:
+            if char not in node:
+                return []
+            node = node[char]
+        return list(self._entries(node))
+
+    def lookup(self, modalias):
+        """Return {kind: [owners]} of the globs matching a device modalias"""
+        result = {}
+        node = self.trie
+        candidates = list(node.get("", []))
+        for char in modalias:
+            if char not in node:
+                break
+            node = node[char]
+            candidates.extend(node.get("", []))
+        for pattern, kind, owner in candidates:
+            if fnmatchcase(modalias, pattern):
+                owners = result.setdefault(kind, [])
+                if owner not in owners:
+                    owners.append(owner)
+        return result
+
+    def lookup_many(self, modaliases):
+        result = {}
+        for modalias in modaliases:
+            if modalias not in result:
+                result[modalias] = self.lookup(modalias)
+        return result
+
+    def save(self, filename):
+        with open(filename, "w") as f:
+            json.dump(self.trie, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename, "r") as f:
+            return cls(json.load(f))
+
+
+def kernel_metadata(kernel):
+    """Return the module metadata of a kernel for --diff
 
-    return type_modules
+    The kernel is a comma-separated list of linux-modules debs, a kernel tree
+    or the version of an installed kernel. The metadata is cached by the
+    package versions of the debs or by the modules.order of the tree.
+    """
+    if kernel.endswith(".deb"):
+        debs = kernel.split(",")
+        key = "+".join(
+            "{Package}_{Version}".format_map(deb_control(deb)) for deb in debs
+        )
+    else:
+        path = kernel if os.path.isdir(kernel) else "/lib/modules/" + kernel
+        path = os.path.realpath(path)
+        mtime = os.stat(path + "/modules.order").st_mtime_ns
+        key = f"{os.path.basename(path)}_{mtime}"
+    cache = os.path.join(MODINFO_CACHE, key + ".json")
+    if os.path.exists(cache):
+        with open(cache, "r") as f:
+            return json.load(f)
+    if kernel.endswith(".deb"):
+        modules = deb_modules(debs, module2meta)[1]
+    else:
+        modules = tree_modules(path, module2meta)
+    os.makedirs(MODINFO_CACHE, exist_ok=True)
+    tmp = f"{cache}.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(modules, f)
+    os.replace(tmp, cache)
+    return modules
+
+
+def modules_diff(old, new):
+    """Compare the alias, firmware and parm lists of two kernels by module name"""
+    with ThreadPoolExecutor(2) as executor:
+        old_modules, new_modules = executor.map(kernel_metadata, (old, new))
+    old_modules = {m["id"]: m for m in old_modules if m is not None}
+    new_modules = {m["id"]: m for m in new_modules if m is not None}
+    diff = {
+        "added": sorted(new_modules.keys() - old_modules.keys()),
+        "removed": sorted(old_modules.keys() - new_modules.keys()),
+        "changed": {},
+    }
+    for name in sorted(old_modules.keys() & new_modules.keys()):
+        changes = {}
+        for field in ("alias", "firmware", "parm"):
+            old_set = set(old_modules[name][field])
+            new_set = set(new_modules[name][field])
+            if old_set != new_set:
+                changes[field] = {
+                    "added": sorted(new_set - old_set),
+                    "removed": sorted(old_set - new_set),
+                }
+        if changes:
+            diff["changed"][name] = changes
+    return diff
+
+
+def modules_filter(modules, type):
+    index = ModaliasIndex()
+    index.add_modules(modules)
+    ids = {owner for _, kind, owner in index.startswith(type) if kind == "module"}
+    return [module for module in modules if module is not None and module["id"] in ids]
 
 
 def main():
@@ -77,47 +625,71 @@ def main():
     parser.add_argument(
         "-e", "--extra", type=str, help="linux-modules-extra debian file path"
     )
+    parser.add_argument(
+        "--modaliases",
+        action="append",
+        default=[],
+        help="add the debian/modaliases of an OEM metapackage or a DKMS package to the modalias index",
+    )
+    parser.add_argument(
+        "--save-index", type=str, help="save the modalias index into the file"
+    )
+    parser.add_argument(
+        "--load-index",
+        type=str,
+        help="use the modalias index saved before instead of reading the modules",
+    )
+    parser.add_argument(
+        "--lookup",
+        type=str,
+        help="print the modules and packages claiming the device modaliases listed in the file ('-' for stdin)",
+    )
+    parser.add_argument(
+        "--diff",
+        nargs=2,
+        metavar=("OLD", "NEW"),
+        help="print the alias, firmware and parm changes between two kernels, given as kernel versions, kernel trees or comma-separated linux-modules debs",
+    )
     args = parser.parse_args()
 
-    if args.deb:
-        if not os.path.exists(args.deb):
-            print("cannot open the file: %s" % args.deb)
-            return 1
+    if args.diff:
+        print(json.dumps(modules_diff(*args.diff), indent=4))
+        return 0
 
-        output = Popen("mktemp -d", stdout=PIPE, shell=TRUE).communicate()[0].strip()
-        tmpdir = output.decode(encoding="utf-8")
-        cmd = "dpkg -x" + " " + args.deb + " " + tmpdir
-        output = Popen(cmd, stdout=PIPE, shell=TRUE).communicate()[0]
+    if args.load_index:
+        index = ModaliasIndex.load(args.load_index)
+    elif args.deb:
+        debs = [args.deb]
         if args.extra:
-            if not os.path.exists(args.extra):
-                print("cannot open the file: %s" % args.extra)
+            debs.append(args.extra)
+        for deb in debs:
+            if not os.path.exists(deb):
+                print("cannot open the file: %s" % deb)
                 return 1
-
-            cmd = "dpkg -x" + " " + args.extra + " " + tmpdir
-            output = Popen(cmd, stdout=PIPE, shell=TRUE).communicate()[0]
-        prefix = tmpdir + "/lib/modules"
-        cmd = "ls -1" + " " + prefix
-        output = Popen(cmd, stdout=PIPE, shell=TRUE).communicate()[0].strip()
-        kernel_version = output.decode(encoding="utf-8")
+        kernel_version, modules = deb_modules(debs)
     else:
         output = Popen("uname -r", stdout=PIPE, shell=TRUE).communicate()[0].strip()
         prefix = "/lib/modules"
         kernel_version = output.decode(encoding="utf-8")
+        modules = tree_modules(prefix + "/" + kernel_version)
 
-    modules_order_path = prefix + "/" + kernel_version + "/modules.order"
-    f = open(modules_order_path, "r")
-    lines = f.readlines()
-    f.close()
-
-    modules = []
-    for line in lines:
-        module_path = prefix + "/" + kernel_version + "/" + line.rstrip()
-        modules.append(modinfo2dict(module_path))
-
-    if args.deb:
-        shutil.rmtree(tmpdir)
-
-    if args.pci:
+    if args.load_index or args.save_index or args.lookup or args.modaliases:
+        if not args.load_index:
+            index = ModaliasIndex()
+            index.add_modules(modules)
+        for filename in args.modaliases:
+            index.add_modaliases(filename)
+        if args.save_index:
+            index.save(args.save_index)
+        if args.lookup:
+            if args.lookup == "-":
+                lines = sys.stdin.readlines()
+            else:
+                with open(args.lookup, "r") as f:
+                    lines = f.readlines()
+            modaliases = [line.strip() for line in lines if line.strip()]
+            print(json.dumps(index.lookup_many(modaliases), indent=4))
+    elif args.pci:
         pci_modules = modules_filter(modules, "pci")
         print(json.dumps(pci_modules, indent=4))
     elif args.usb:
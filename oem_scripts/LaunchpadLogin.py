@@ -6,6 +6,7 @@ from launchpadlib.uris import lookup_service_root
 from launchpadlib import credentials
 import logging
 import os
+import threading
 
 
 class ShutUpAndTakeMyTokenAuthorizationEngine(
@@ -122,3 +123,24 @@ class LaunchpadLogin:
                 launchpadlib_dir=launchpadlib_dir,
                 version=version,
             )
+
+
+class ThreadLocalLaunchpad:
+    """Give every thread its own LaunchpadLogin
+
+    launchpadlib is not thread-safe, so the workers of a thread pool load the
+    objects they need by their links through their own login.
+    """
+
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.local = threading.local()
+
+    @property
+    def lp(self):
+        if not hasattr(self.local, "lp"):
+            self.local.lp = LaunchpadLogin(**self.kwargs).lp
+        return self.local.lp
+
+    def load(self, link):
+        return self.lp.load(link)
@@ -48,6 +48,8 @@ ALLOWED_KERNEL_META_LIST = (
 
 TAG_LIST = ["oem-meta-packages", "oem-priority", f"oem-scripts-{__version__}"]
 
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "oem-scripts")
+
 
 # Python 3.9 supports this.
 def remove_prefix(s, prefix):
@@ -111,7 +113,36 @@ def _run_command(
     return (out, err, proc.returncode)
 
 
-def _get_items_from_git(project: str, branch: str, pkg_name: str) -> tuple:
+# Bare mirrors updated in this run
+_git_mirrors = {}
+
+
+def _git_mirror(project: str) -> str:
+    """Return the local bare mirror of the projects-meta Git repository.
+
+    The mirror is kept under CACHE_DIR and fetched at most once per run, so
+    the platforms of the same project are cloned from it instead of Launchpad.
+    """
+    if project in _git_mirrors:
+        return _git_mirrors[project]
+    url = f"https://git.launchpad.net/~oem-solutions-engineers/pc-enablement/+git/oem-{project}-projects-meta"
+    path = os.path.join(CACHE_DIR, "git", f"oem-{project}-projects-meta.git")
+    if os.path.isdir(path):
+        _run_command(["git", "--git-dir", path, "remote", "update", "--prune"])
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _run_command(["git", "clone", "--mirror", url, path])
+    _git_mirrors[project] = path
+    return path
+
+
+def _get_items_from_git(
+    project: str, branch: str, pkg_name: str, mirror=False
+) -> tuple:
+    if mirror:
+        url = "file://" + _git_mirror(project)
+    else:
+        url = f"https://git.launchpad.net/~oem-solutions-engineers/pc-enablement/+git/oem-{project}-projects-meta"
     git_command = (
         "git",
         "clone",
@@ -119,7 +150,7 @@ def _get_items_from_git(project: str, branch: str, pkg_name: str) -> tuple:
         "1",
         "-b",
         branch,
-        f"https://git.launchpad.net/~oem-solutions-engineers/pc-enablement/+git/oem-{project}-projects-meta",
+        url,
         pkg_name,
     )
     with TemporaryDirectory() as tmpdir:
@@ -0,0 +1,416 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2024  Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Python counterpart of setup-apt-dir.sh
+
+    from oem_scripts.aptdir import setup_apt_dir
+
+    apt_dir = setup_apt_dir("noble", ppas=["ppa:oem-archive/sutton"], lp=lp)
+    pkg = apt_dir.cache["oem-sutton-meta"]
+"""
+
+import os
+import shutil
+
+from apt import apt_pkg
+from apt.progress.base import AcquireProgress
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from lazr.restfulclient.errors import HTTPError
+from logging import debug, critical
+from oem_scripts import CACHE_DIR, _run_command, remove_prefix
+from tempfile import TemporaryDirectory
+
+DEFAULT_MIRROR = "http://archive.ubuntu.com/ubuntu"
+
+# The same mapping as setup-apt-dir.sh
+UBUNTU_ARCHIVE_KEYS = {
+    "xenial": "790BC7277767219C42C86F933B4FE6ACC0B21F32",
+    "bionic": "790BC7277767219C42C86F933B4FE6ACC0B21F32",
+    "focal": "790BC7277767219C42C86F933B4FE6ACC0B21F32",
+    "hirsute": "F6ECB3762474EDA9D21B7022871920D1991BC93C",
+    "impish": "F6ECB3762474EDA9D21B7022871920D1991BC93C",
+    "jammy": "F6ECB3762474EDA9D21B7022871920D1991BC93C",
+    "mantic": "F6ECB3762474EDA9D21B7022871920D1991BC93C",
+    "noble": "F6ECB3762474EDA9D21B7022871920D1991BC93C",
+}
+
+KEYRING_DIR = os.path.join(CACHE_DIR, "keyrings")
+
+_keyrings = {}
+_ppa_sources = {}
+
+
+def export_key(fingerprint: str) -> str:
+    """Return the armored public key of fingerprint.
+
+    The key is exported from gpg only once and kept in KEYRING_DIR.
+    """
+    if fingerprint in _keyrings:
+        return _keyrings[fingerprint]
+
+    keyring = os.path.join(KEYRING_DIR, f"{fingerprint}.pub")
+    if os.path.exists(keyring):
+        with open(keyring, "r") as f:
+            _keyrings[fingerprint] = f.read()
+        return _keyrings[fingerprint]
+
+    _, _, returncode = _run_command(
+        ["gpg", "--fingerprint", fingerprint], returncode=(0, 2), silent=True
+    )
+    if returncode != 0:
+        _run_command(
+            ["gpg", "--keyserver", "keyserver.ubuntu.com", "--recv-key", fingerprint]
+        )
+    key, _, _ = _run_command(["gpg", "--export", "--armor", fingerprint], silent=True)
+    if not key:
+        critical(f"It can not export the public key of {fingerprint}.")
+        exit(1)
+    key += "\n"
+
+    os.makedirs(KEYRING_DIR, exist_ok=True)
+    with open(keyring + ".tmp", "w") as f:
+        f.write(key)
+    os.replace(keyring + ".tmp", keyring)
+    _keyrings[fingerprint] = key
+    return key
+
+
+def get_private_ppa(lp, ppa: str) -> (str, str):
+    """Resolve ppa:group/archive into (URL, fingerprint) like get-private-ppa."""
+    if ppa in _ppa_sources:
+        return _ppa_sources[ppa]
+
+    group, name = remove_prefix(ppa, "ppa:").split("/", maxsplit=1)
+    archive = lp.people[group].getPPAByName(name=name)
+    if archive.private:
+        try:
+            url = lp.me.getArchiveSubscriptionURL(archive=archive)
+        except HTTPError:
+            critical(
+                f"You may not have the subscription of {ppa} yet so you can not get the source list."
+            )
+            critical(
+                f"Please access https://launchpad.net/~{group}/+archive/ubuntu/{name}/+subscriptions to subscribe it."
+            )
+            exit(1)
+    else:
+        url = f"http://ppa.launchpad.net/{group}/{name}/ubuntu"
+    debug(f"{ppa} {url} {archive.signing_key_fingerprint}")
+    _ppa_sources[ppa] = (url, archive.signing_key_fingerprint)
+    return _ppa_sources[ppa]
+
+
+class AptDir:
+    """The apt dir layout created by setup-apt-dir.sh
+
+    It is removed by cleanup() only when it is created by itself.
+    """
+
+    def __init__(
+        self,
+        codename: str,
+        apt_dir=None,
+        lp=None,
+        mirror=DEFAULT_MIRROR,
+        base=True,
+        updates=True,
+        backports=True,
+        proposed=False,
+        community=True,
+        source=False,
+        i386=False,
+        ppas=(),
+        extra_repos=(),
+        extra_keys=(),
+        dpkg_status=None,
+    ):
+        if codename not in UBUNTU_ARCHIVE_KEYS:
+            critical(f"{codename} is not supported by oem_scripts.aptdir yet.")
+            exit(1)
+        if ppas and lp is None:
+            critical("It needs a Launchpad login to resolve PPAs.")
+            exit(1)
+        self.codename = codename
+        self.lp = lp
+        self.mirror = mirror
+        self.base = base
+        self.updates = updates
+        self.backports = backports
+        self.proposed = proposed
+        self.community = community
+        self.source = source
+        self.i386 = i386
+        self.ppas = list(ppas)
+        self.extra_repos = list(extra_repos)
+        self.extra_keys = list(extra_keys)
+        self.dpkg_status = dpkg_status
+        self._tmpdir = None
+        if apt_dir is None:
+            self._tmpdir = TemporaryDirectory(prefix="apt.")
+            apt_dir = self._tmpdir.name
+        self.path = apt_dir
+        self.cache = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cleanup()
+
+    def cleanup(self) -> None:
+        self.cache = None
+        if self._tmpdir:
+            self._tmpdir.cleanup()
+            self._tmpdir = None
+
+    def get_sources(self) -> (list, list):
+        """Return the lines of sources.list and the fingerprints it needs."""
+        pubkey = UBUNTU_ARCHIVE_KEYS[self.codename]
+        keys = [pubkey]
+        lines = []
+        arch = "" if self.i386 else " arch=amd64"
+        if self.community:
+            dist = "main restricted universe multiverse"
+        else:
+            dist = "main restricted"
+        for enabled, suite in (
+            (self.base, self.codename),
+            (self.updates, f"{self.codename}-updates"),
+            (self.backports, f"{self.codename}-backports"),
+            (self.proposed, f"{self.codename}-proposed"),
+        ):
+            if not enabled:
+                continue
+            options = f"[signed-by={self.path}/{pubkey}.pub{arch}]"
+            lines.append(f"deb {options} {self.mirror} {suite} {dist}")
+            if self.source:
+                lines.append(f"deb-src {options} {self.mirror} {suite} {dist}")
+        for ppa in self.ppas:
+            url, key = get_private_ppa(self.lp, ppa)
+            keys.append(key)
+            lines.append(
+                f"deb [signed-by={self.path}/{key}.pub] {url} {self.codename} main"
+            )
+            if self.source:
+                lines.append(
+                    f"deb-src [signed-by={self.path}/{key}.pub] {url} {self.codename} main"
+                )
+        lines.extend(self.extra_repos)
+        keys.extend(self.extra_keys)
+        return lines, keys
+
+    def create(self) -> None:
+        """Create the directory layout, sources.list and public keys."""
+        for folder in (
+            "var/lib/apt/lists",
+            "var/lib/dpkg",
+            "etc/apt/preferences.d",
+        ):
+            os.makedirs(os.path.join(self.path, folder), exist_ok=True)
+        status = os.path.join(self.path, "var/lib/dpkg/status")
+        if self.dpkg_status and os.path.isfile(self.dpkg_status):
+            shutil.copyfile(self.dpkg_status, status)
+        else:
+            open(status, "w").close()
+
+        lines, keys = self.get_sources()
+        with open(os.path.join(self.path, "etc/apt/sources.list"), "w") as f:
+            for line in lines:
+                f.write(line + "\n")
+        for key in keys:
+            with open(os.path.join(self.path, f"{key}.pub"), "w") as f:
+                f.write(export_key(key))
+
+    @contextmanager
+    def _config(self):
+        with _apt_config(self.path):
+            yield
+
+    def update(self, max_hosts=None) -> None:
+        """Run the equivalent of `apt-get update` and load apt_pkg.Cache."""
+        _update(self.path, max_hosts)
+        self.load()
+
+    def load(self) -> apt_pkg.Cache:
+        """Load apt_pkg.Cache from the indexes already fetched."""
+        with self._config():
+            self.cache = apt_pkg.Cache(progress=None)
+        return self.cache
+
+
+@contextmanager
+def _apt_config(path: str, options=None):
+    saved = {}
+    options = dict(options or {})
+    options["Dir"] = path
+    options["Dir::State::status"] = os.path.join(path, "var/lib/dpkg/status")
+    for key, value in options.items():
+        saved[key] = apt_pkg.config.get(key)
+        apt_pkg.config.set(key, str(value))
+    apt_pkg.init_system()
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value:
+                apt_pkg.config.set(key, value)
+            else:
+                apt_pkg.config.clear(key)
+        apt_pkg.init_system()
+
+
+def _update(path: str, max_hosts=None) -> None:
+    options = {"Acquire::Queue-Mode": "host"}
+    if max_hosts:
+        options["Acquire::QueueHost::Limit"] = max_hosts
+    with _apt_config(path, options):
+        sources = apt_pkg.SourceList()
+        sources.read_main_list()
+        lockfile = apt_pkg.config.find_dir("Dir::State::Lists") + "lock"
+        lock = apt_pkg.get_lock(lockfile)
+        try:
+            cache = apt_pkg.Cache(progress=None)
+            if not cache.update(AcquireProgress(), sources):
+                critical(f"It failed to update the apt dir {path}.")
+                exit(1)
+        finally:
+            os.close(lock)
+
+
+def _split_source_line(line: str) -> (str, str, str, str, list):
+    """Split 'deb [options] uri suite components...' into its fields."""
+    fields = line.split()
+    kind = fields.pop(0)
+    options = ""
+    if fields[0].startswith("["):
+        while not fields[0].endswith("]"):
+            options += fields.pop(0) + " "
+        options += fields.pop(0)
+    uri, suite, *components = fields
+    return kind, options, uri, suite, components
+
+
+def _lists_prefix(uri: str, suite: str) -> str:
+    """Return the prefix of the files apt names in lists/ for a source entry.
+
+    A suite ending with '/' is a flat repository whose indexes are right
+    under uri/suite instead of uri/dists/suite, e.g. `deb uri ./`.
+    """
+    uri = uri.rstrip("/") + "/"
+    if suite.endswith("/"):
+        return apt_pkg.uri_to_filename(uri if suite == "/" else uri + suite)
+    return apt_pkg.uri_to_filename(f"{uri}dists/{suite}/")
+
+
+def setup_apt_dir(codename: str, **kwargs) -> AptDir:
+    """The same as `setup-apt-dir.sh` but without bash, get-private-ppa and apt-get.
+
+    All keyword arguments are passed to AptDir.
+    """
+    apt_dir = AptDir(codename, **kwargs)
+    apt_dir.create()
+    apt_dir.update()
+    return apt_dir
+
+
+def setup_apt_dirs(apt_dirs, max_hosts=None) -> list:
+    """Set up many AptDir objects with one shared download.
+
+    The source entries of all apt dirs are merged so every index URL is
+    fetched only once, and apt's acquire system downloads them from all
+    hosts concurrently with one pipelined connection per host. max_hosts
+    limits how many hosts are accessed at the same time. The fetched
+    indexes are then linked into every apt dir and apt_pkg.Cache is loaded.
+    """
+    apt_dirs = list(apt_dirs)
+    # Entries of the same (type, uri, suite) must share the same options in
+    # one sources.list so the conflicting ones go to another batch.
+    batches = []
+    # The lists prefixes of every apt dir and the batches fetching them.
+    prefixes = []
+    for apt_dir in apt_dirs:
+        apt_dir.create()
+        prefixes.append([])
+        lines, keys = apt_dir.get_sources()
+        for line in lines:
+            kind, options, uri, suite, components = _split_source_line(line)
+            for batch in batches:
+                entry = batch["entries"].get((kind, uri, suite))
+                if entry is None or entry["options"] == options.replace(
+                    apt_dir.path, batch["dir"].path
+                ):
+                    break
+            else:
+                batch = {"dir": AptDir(apt_dir.codename), "entries": {}, "keys": set()}
+                batches.append(batch)
+            entry = batch["entries"].setdefault(
+                (kind, uri, suite),
+                {
+                    "options": options.replace(apt_dir.path, batch["dir"].path),
+                    "components": set(),
+                },
+            )
+            entry["components"].update(components)
+            batch["keys"].update(keys)
+            prefixes[-1].append((_lists_prefix(uri, suite), batch))
+
+    for batch in batches:
+        path = batch["dir"].path
+        for folder in ("var/lib/apt/lists", "var/lib/dpkg", "etc/apt/preferences.d"):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+        open(os.path.join(path, "var/lib/dpkg/status"), "w").close()
+        with open(os.path.join(path, "etc/apt/sources.list"), "w") as f:
+            for (kind, uri, suite), entry in batch["entries"].items():
+                components = " ".join(sorted(entry["components"]))
+                f.write(f"{kind} {entry['options']} {uri} {suite} {components}\n")
+        for key in batch["keys"]:
+            with open(os.path.join(path, f"{key}.pub"), "w") as f:
+                f.write(export_key(key))
+        debug(f"{path} fetches {len(batch['entries'])} source entries")
+
+    if len(batches) == 1:
+        _update(batches[0]["dir"].path, max_hosts)
+    elif batches:
+        # apt_pkg.config is global so every batch needs its own process.
+        with ProcessPoolExecutor(max_workers=len(batches)) as executor:
+            futures = [
+                executor.submit(_update, batch["dir"].path, max_hosts)
+                for batch in batches
+            ]
+            for future in futures:
+                future.result()
+
+    for apt_dir, lists_prefixes in zip(apt_dirs, prefixes):
+        lists = os.path.join(apt_dir.path, "var/lib/apt/lists")
+        for prefix, batch in lists_prefixes:
+            folder = os.path.join(batch["dir"].path, "var/lib/apt/lists")
+            for name in os.listdir(folder):
+                target = os.path.join(lists, name)
+                if not name.startswith(prefix) or os.path.exists(target):
+                    continue
+                try:
+                    os.link(os.path.join(folder, name), target)
+                except OSError:
+                    shutil.copyfile(os.path.join(folder, name), target)
+        apt_dir.load()
+
+    for batch in batches:
+        batch["dir"].cleanup()
+
+    return apt_dirs
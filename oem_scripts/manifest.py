@@ -0,0 +1,133 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Copyright (C) 2024  Canonical Ltd.
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+"""Reader of the image manifests
+
+    from oem_scripts.manifest import Manifest
+
+    manifest = Manifest("image.manifest")
+    for path, fields in manifest["deb"].items():
+        ...
+
+The YAML is parsed only once per manifest content. Every top-level section
+is cached as its own pickle keyed by the SHA-256 of the manifest so later
+reads only load the sections they use.
+"""
+
+import hashlib
+import os
+import pickle
+import yaml
+
+from logging import debug
+from oem_scripts import CACHE_DIR
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+MANIFEST_CACHE = os.path.join(CACHE_DIR, "manifests")
+
+
+def file_digest(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """Dict-like view of the sections in an image manifest
+
+    Set cache_dir to None to parse the manifest without caching it.
+    """
+
+    def __init__(self, filename: str, cache_dir=MANIFEST_CACHE):
+        self.filename = filename
+        self.digest = file_digest(filename)
+        self.path = os.path.join(cache_dir, self.digest) if cache_dir else None
+        self._sections = None
+        self._data = {}
+
+    def _parse(self) -> None:
+        debug(f"Parsing {self.filename}")
+        with open(self.filename, "rb") as f:
+            data = yaml.load(f, Loader=SafeLoader)
+        if data is None:
+            data = {}
+        self._data = data
+        self._sections = list(data.keys())
+        if self.path is None:
+            return
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            for idx, value in enumerate(data.values()):
+                self._dump(f"{idx}.pickle", value)
+            self._dump("sections.pickle", self._sections)
+        except OSError as e:
+            debug(f"It can not cache {self.filename}: {e}")
+
+    def _dump(self, name: str, value) -> None:
+        tmp = os.path.join(self.path, f".{name}.{os.getpid()}")
+        with open(tmp, "wb") as f:
+            pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, os.path.join(self.path, name))
+
+    def _load(self, name: str):
+        if self.path is None:
+            raise OSError("The cache is disabled.")
+        with open(os.path.join(self.path, name), "rb") as f:
+            return pickle.load(f)
+
+    def keys(self):
+        if self._sections is None:
+            try:
+                self._sections = self._load("sections.pickle")
+            except (OSError, pickle.UnpicklingError, EOFError):
+                self._parse()
+        return dict.fromkeys(self._sections).keys()
+
+    def __contains__(self, section) -> bool:
+        return section in self.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __getitem__(self, section):
+        if section not in self._data:
+            if section not in self.keys():
+                raise KeyError(section)
+            if section not in self._data:
+                try:
+                    idx = self._sections.index(section)
+                    self._data[section] = self._load(f"{idx}.pickle")
+                except (OSError, pickle.UnpicklingError, EOFError):
+                    self._parse()
+        return self._data[section]
+
+    def get(self, section, default=None):
+        if section in self:
+            return self[section]
+        return default
+
+    def items(self):
+        """Yield (section, value) and load each section only when reached."""
+        for section in self.keys():
+            yield section, self[section]
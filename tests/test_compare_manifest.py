@@ -0,0 +1,86 @@
+import importlib
+import unittest
+
+CHANGELOG = """foo (1.3-1) noble; urgency=medium
+
+  * The third change.
+
+ -- Jane Doe <jane@example.com>  Wed, 03 Jan 2024 00:00:00 +0000
+
+foo (1.2-1) noble; urgency=medium
+
+  * The second change.
+
+ -- Jane Doe <jane@example.com>  Tue, 02 Jan 2024 00:00:00 +0000
+
+foo (1.1-1) noble; urgency=medium
+
+  * The first change.
+
+ -- Jane Doe <jane@example.com>  Mon, 01 Jan 2024 00:00:00 +0000
+"""
+
+
+class TestCompareManifest(unittest.TestCase):
+    def setUp(self):
+        self.compare_manifest = importlib.import_module("compare_manifest")
+
+    def tearDown(self):
+        self.compare_manifest = None
+
+    def test_parse_changelog(self):
+        entries = self.compare_manifest.parse_changelog(CHANGELOG)
+        self.assertEqual(
+            [version for version, _ in entries], ["1.3-1", "1.2-1", "1.1-1"]
+        )
+        self.assertTrue(entries[1][1].startswith("foo (1.2-1) noble;"))
+        self.assertIn("The second change.", entries[1][1])
+        self.assertNotIn("The first change.", entries[1][1])
+
+    def test_changelog_diff(self):
+        entries = self.compare_manifest.parse_changelog(CHANGELOG)
+        diff = self.compare_manifest.changelog_diff(entries, "1.1-1", "1.3-1")
+        self.assertIn("The third change.", diff)
+        self.assertIn("The second change.", diff)
+        self.assertNotIn("The first change.", diff)
+        diff = self.compare_manifest.changelog_diff(entries, "1.1-1", "1.2-1")
+        self.assertNotIn("The third change.", diff)
+        self.assertIn("The second change.", diff)
+        self.assertEqual(
+            self.compare_manifest.changelog_diff(entries, "1.3-1", "1.3-1"), ""
+        )
+
+    def test_normalize_name(self):
+        self.assertEqual(
+            self.compare_manifest.normalize_name("linux-modules-6.8.0-45-generic"),
+            "linux-modules-#-generic",
+        )
+        self.assertEqual(
+            self.compare_manifest.normalize_name(
+                "pool/main/l/linux/linux-modules-6.8.0-47-generic_6.8.0-47.47_amd64.deb"
+            ),
+            "linux-modules-#-generic",
+        )
+
+    def test_rename_index(self):
+        index = self.compare_manifest.RenameIndex()
+        index.add("linux-modules-6.8.0-47-generic", {"source": "linux"})
+        index.add("linux-tools-6.8.0-47", {"source": "linux"})
+        index.add("python3-foo-bar", {"source": "foo"})
+        # The same name after normalize_name() is paired first.
+        self.assertEqual(
+            index.pop_rename("linux-modules-6.8.0-45-generic", "linux"),
+            ("linux-modules-6.8.0-47-generic", {"source": "linux"}),
+        )
+        # A similar name is only paired with the debs of the same source.
+        self.assertEqual(index.pop_rename("python3-foo", "bar"), (None, None))
+        self.assertEqual(
+            index.pop_rename("python3-foo", "foo"),
+            ("python3-foo-bar", {"source": "foo"}),
+        )
+        self.assertEqual(index.pop_rename("libunrelated1", "linux"), (None, None))
+        self.assertEqual(list(index), ["linux-tools-6.8.0-47"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,192 @@
+import importlib
+import os
+import struct
+import tempfile
+import unittest
+
+
+def der(tag, *children):
+    content = b"".join(children)
+    if len(content) < 0x80:
+        return bytes((tag, len(content))) + content
+    length = len(content).to_bytes(2, "big")
+    return bytes((tag, 0x82)) + length + content
+
+
+def elf(sections):
+    """Build a little-endian ELF64 blob with the given {name: content} sections."""
+    names = list(sections) + [".shstrtab"]
+    shstrtab = b"\0"
+    offsets = {}
+    for name in names:
+        offsets[name] = len(shstrtab)
+        shstrtab += name.encode() + b"\0"
+    contents = list(sections.values()) + [shstrtab]
+    data = bytearray(64)
+    headers = [bytes(64)]
+    for name, content in zip(names, contents):
+        headers.append(
+            struct.pack(
+                "<IIQQQQIIQQ",
+                offsets[name],
+                1,
+                0,
+                0,
+                len(data),
+                len(content),
+                0,
+                0,
+                1,
+                0,
+            )
+        )
+        data += content
+    shoff = len(data)
+    data += b"".join(headers)
+    data[:16] = b"\x7fELF" + bytes((2, 1, 1)) + bytes(9)
+    struct.pack_into("<Q", data, 0x28, shoff)
+    struct.pack_into("<HHH", data, 0x3A, 64, len(headers), len(headers) - 1)
+    return bytes(data)
+
+
+def pkcs7(signer, serial):
+    """Build the part of a PKCS#7 signature that modinfo reads."""
+    issuer = der(
+        0x30, der(0x31, der(0x30, der(0x06, b"\x55\x04\x03"), der(0x0C, signer)))
+    )
+    sha256 = der(0x30, der(0x06, bytes.fromhex("608648016503040201")), der(0x05))
+    signer_info = der(
+        0x30, der(0x02, b"\x01"), der(0x30, issuer, der(0x02, serial)), sha256
+    )
+    signed_data = der(
+        0x30,
+        der(0x02, b"\x01"),
+        der(0x31, sha256),
+        der(0x30, der(0x06, bytes.fromhex("2a864886f70d010701"))),
+        der(0x31, signer_info),
+    )
+    return der(
+        0x30, der(0x06, bytes.fromhex("2a864886f70d010702")), der(0xA0, signed_data)
+    )
+
+
+def sign(data, sig):
+    trailer = struct.pack(">BBBBB3xI", 0, 0, 2, 0, 0, len(sig))
+    return data + sig + trailer + b"~Module signature appended~\n"
+
+
+class TestModinfo2Json(unittest.TestCase):
+    def setUp(self):
+        self.modinfo2json = importlib.import_module("modinfo2json")
+        self.module = elf(
+            {
+                ".text": b"\x90" * 8,
+                ".modinfo": b"license=GPL\0alias=pci:v00008086d*\0parmtype=debug:int\0parm=debug:Enable debug\0",
+            }
+        )
+
+    def tearDown(self):
+        self.modinfo2json = None
+
+    def test_elf_section(self):
+        self.assertEqual(
+            self.modinfo2json.elf_section(self.module, ".text"), b"\x90" * 8
+        )
+        self.assertTrue(
+            self.modinfo2json.elf_section(self.module, ".modinfo").startswith(
+                b"license=GPL\0"
+            )
+        )
+        self.assertIsNone(self.modinfo2json.elf_section(self.module, ".data"))
+        self.assertIsNone(self.modinfo2json.elf_section(b"not an elf", ".modinfo"))
+
+    def test_modinfo(self):
+        lines = self.modinfo2json.modinfo("foo.ko", self.module).split("\n")
+        self.assertEqual(
+            lines,
+            [
+                "filename:       foo.ko",
+                "license:        GPL",
+                "alias:          pci:v00008086d*",
+                "parm:           debug:Enable debug (int)",
+            ],
+        )
+
+    def test_unsigned_module(self):
+        self.assertEqual(self.modinfo2json.module_signature(self.module), [])
+
+    def test_module_signature(self):
+        data = sign(
+            self.module, pkcs7(b"Build time autogenerated kernel key", b"\x00\x12\xab")
+        )
+        self.assertEqual(
+            self.modinfo2json.module_signature(data),
+            [
+                ("sig_id", "PKCS#7"),
+                ("signer", "Build time autogenerated kernel key"),
+                ("sig_key", "12:AB"),
+                ("sig_hashalgo", "sha256"),
+            ],
+        )
+        self.assertIn(
+            "sig_hashalgo:   sha256", self.modinfo2json.modinfo("foo.ko", data)
+        )
+
+    def test_broken_signature(self):
+        data = sign(self.module, b"\x30\x03\x02\x01")
+        self.assertEqual(self.modinfo2json.module_signature(data), [])
+
+
+class TestModaliasIndex(unittest.TestCase):
+    def setUp(self):
+        modinfo2json = importlib.import_module("modinfo2json")
+        self.index = modinfo2json.ModaliasIndex()
+        self.index.add_modules(
+            [
+                {"id": "e1000e", "alias": ["pci:v00008086d000015B8sv*sd*bc*sc*i*"]},
+                {"id": "iwlwifi", "alias": ["pci:v00008086d*sv*sd*bc02sc80i*"]},
+                {"id": "snd_hda_intel", "alias": ["pci:v00008086d*sv*sd*bc04sc03i*"]},
+                None,
+            ]
+        )
+        self.index.add("pci:*sv00001028sd00000C11*", "meta", "oem-somerville-foo-meta")
+
+    def tearDown(self):
+        self.index = None
+
+    def test_lookup(self):
+        self.assertEqual(
+            self.index.lookup("pci:v00008086d000015B8sv00001028sd00000C11bc02sc00i00"),
+            {"module": ["e1000e"], "meta": ["oem-somerville-foo-meta"]},
+        )
+        self.assertEqual(
+            self.index.lookup("pci:v00008086d00002725sv00008086sd00000024bc02sc80i00"),
+            {"module": ["iwlwifi"]},
+        )
+        self.assertEqual(self.index.lookup("usb:v1D6Bp0002d0605dc09dsc00dp01"), {})
+
+    def test_startswith(self):
+        self.assertEqual(
+            sorted(owner for _, _, owner in self.index.startswith("pci:v00008086d")),
+            ["e1000e", "iwlwifi", "snd_hda_intel"],
+        )
+        self.assertEqual(self.index.startswith("usb:"), [])
+
+    def test_save_and_load(self):
+        modinfo2json = importlib.import_module("modinfo2json")
+        modaliases = [
+            "pci:v00008086d000015B8sv00001028sd00000C11bc02sc00i00",
+            "pci:v00008086d00000A0Csv00001028sd00000C11bc04sc03i00",
+            "usb:v1D6Bp0002d0605dc09dsc00dp01",
+        ]
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, "index.json")
+            self.index.save(filename)
+            index = modinfo2json.ModaliasIndex.load(filename)
+        self.assertEqual(
+            index.lookup_many(modaliases), self.index.lookup_many(modaliases)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
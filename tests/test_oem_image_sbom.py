@@ -0,0 +1,80 @@
+import importlib.machinery
+import importlib.util
+import io
+import os
+import unittest
+
+BUILDS = [
+    ("20240101", {"foo": {"version": "1.1-1"}, "bar": {"version": "2.0-1"}}),
+    ("20240102", {"foo": {"version": "1.0-1"}, "bar": {"version": "2.1-1"}}),
+    ("20240103", {"foo": {"version": "1.2-1"}, "baz": {"version": "0.1-1"}}),
+]
+
+
+def load_script(name, path):
+    loader = importlib.machinery.SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+class TestSbomMatrix(unittest.TestCase):
+    def setUp(self):
+        self.sbom = load_script(
+            "oem_image_sbom",
+            os.path.join(os.path.dirname(__file__), "..", "oem-image-sbom"),
+        )
+
+    def tearDown(self):
+        self.sbom = None
+
+    def test_sbom_matrix(self):
+        rows = {row["package"]: row for row in self.sbom.sbom_matrix(BUILDS)}
+        self.assertEqual(list(rows), ["bar", "baz", "foo"])
+
+        self.assertEqual(rows["foo"]["first_seen"], "20240101")
+        self.assertEqual(rows["foo"]["last_seen"], "20240103")
+        # 1.1-1 goes back to 1.0-1 in the second build.
+        self.assertTrue(rows["foo"]["regression"])
+
+        self.assertEqual(rows["bar"]["first_seen"], "20240101")
+        self.assertEqual(rows["bar"]["last_seen"], "20240102")
+        self.assertFalse(rows["bar"]["regression"])
+        self.assertEqual(
+            rows["bar"]["versions"],
+            {"20240101": "2.0-1", "20240102": "2.1-1", "20240103": None},
+        )
+
+        self.assertEqual(rows["baz"]["first_seen"], "20240103")
+        self.assertEqual(rows["baz"]["last_seen"], "20240103")
+        self.assertFalse(rows["baz"]["regression"])
+
+    def test_write_matrix(self):
+        output = io.StringIO()
+        self.sbom.write_matrix(BUILDS, output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(
+            lines[0],
+            "package,first_seen,last_seen,regression,20240101,20240102,20240103",
+        )
+        self.assertEqual(lines[1], "bar,20240101,20240102,False,2.0-1,2.1-1,")
+        self.assertEqual(lines[3], "foo,20240101,20240103,True,1.1-1,1.0-1,1.2-1")
+
+    def test_build_names(self):
+        self.assertEqual(
+            self.sbom.build_names(["out/20240101.manifest", "out/20240102.sbom"]),
+            ["20240101", "20240102"],
+        )
+        self.assertEqual(
+            self.sbom.build_names(
+                ["builds/1/image.manifest", "builds/2/image.manifest"]
+            ),
+            ["1/image", "2/image"],
+        )
+        with self.assertRaises(ValueError):
+            self.sbom.build_names(["out/image.manifest", "out/image.manifest"])
+
+
+if __name__ == "__main__":
+    unittest.main()